@@ -13,24 +13,89 @@ Usage:
 
 from dotenv import load_dotenv
 import os
-import json
-from agents import Agent, function_tool
-from datetime import datetime, timedelta
-from openai import OpenAI
+import tempfile
+import hashlib
+import ijson
+import itertools
+import logging
+import orjson
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
 import requests
-from typing import Dict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import TYPE_CHECKING, Dict
+from cachetools import TTLCache
+from .amadeus_summary import summarize_items
+
+if TYPE_CHECKING:
+    from agents import Agent
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv(override=True)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+# OpenAI client, created on first use to keep module import fast
+_client = None
+
+
+def _get_openai_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    return _client
+
 
 # Amadeus API Configuration
 AMADEUS_BASE_URL_V1 = "https://test.api.amadeus.com/v1"
 AMADEUS_BASE_URL_V2 = "https://test.api.amadeus.com/v2"
+AMADEUS_BASE_URLS = {"v1": AMADEUS_BASE_URL_V1, "v2": AMADEUS_BASE_URL_V2}
 AMADEUS_AUTH_URL = "https://test.api.amadeus.com/v1/security/oauth2/token"
 
+# Refresh tokens this long before Amadeus expires them
+TOKEN_EXPIRY_BUFFER_SECONDS = 300
+
+# HTTP status groups that decide how execute_amadeus_query retries
+AUTH_ERROR_STATUSES = {401, 403}
+BAD_REQUEST_STATUSES = {400, 422}
+TRANSIENT_ERROR_STATUSES = {429, 500, 502, 503, 504}
+
+# API version serving each endpoint; unknown endpoints default to v2 and
+# fall back to the other version on 404
+_ENDPOINT_VERSION = {
+    "shopping/flight-offers": "v2",
+    "shopping/availability/flight-availabilities": "v1",
+    "shopping/flight-offers/pricing": "v1",
+}
+
+# Successful responses larger than this are summarized while streaming instead
+# of being parsed in full
+STREAM_SUMMARY_THRESHOLD_BYTES = 1024 * 1024
+RESPONSE_CHUNK_BYTES = 64 * 1024
+
+# Persistent cache of successful Amadeus responses, shared across restarts.
+# Opened on first use by _get_disk_cache; False once opening it has failed.
+RESPONSE_CACHE_TTL_SECONDS = 600
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+
+# Shared HTTP session so TCP/TLS connections to Amadeus are kept alive and
+# reused across retries and requests. Retries are handled by execute_amadeus_query.
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=Retry(total=0))
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.headers.update({'Content-Type': 'application/json'})
+
+# Fires fallback strategies in parallel when the first attempt hits a server error
+_RETRY_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
 
 class AmadeusAPIClient:
     """
@@ -40,239 +105,767 @@ class AmadeusAPIClient:
     def __init__(self, client_id: str, client_secret: str):
         self.client_id = client_id
         self.client_secret = client_secret
-        self.access_token = None
-        self.token_expires_at = None
+        # (token, expiry) published as one tuple so the lock-free check in
+        # _cached_token always sees a matching pair
+        self._token = (None, None)
+        # Serializes refreshes so concurrent requests share a single token fetch
+        self._lock = threading.Lock()
+
+    @property
+    def access_token(self):
+        """The current access token, or None before the first fetch."""
+        return self._token[0]
+
+    @property
+    def token_expires_at(self):
+        """When the current token should be refreshed (expiry minus the buffer)."""
+        return self._token[1]
+
+    def _cached_token(self):
+        """Return the current token if it is still valid, otherwise None."""
+        token, expires_at = self._token
+        if token and expires_at and datetime.now() < expires_at:
+            return token
+        return None
 
     def get_access_token(self) -> str:
         """Get or refresh Amadeus API access token."""
-        if self.access_token and self.token_expires_at and datetime.now() < self.token_expires_at:
-            return self.access_token
-
-        print("🔑 Getting new Amadeus access token...")
-
-        auth_data = {
-            'grant_type': 'client_credentials',
-            'client_id': self.client_id,
-            'client_secret': self.client_secret
-        }
-
-        response = requests.post(AMADEUS_AUTH_URL, data=auth_data)
-
-        if response.status_code == 200:
-            token_data = response.json()
-            self.access_token = token_data['access_token']
-            expires_in = token_data.get('expires_in', 3600)
-            self.token_expires_at = datetime.now() + timedelta(seconds=expires_in - 60)
-            print("✅ Access token obtained successfully")
-            return self.access_token
-        else:
-            raise Exception(f"Failed to get Amadeus access token: {response.status_code} - {response.text}")
-
-
-# Initialize Amadeus client
-amadeus_client = AmadeusAPIClient(
-    client_id=os.environ.get('AMADEUS_API_KEY'),
-    client_secret=os.environ.get('AMADEUS_API_SECRECT')
-)
-
-
-@function_tool
-def parse_flight_query(user_query: str) -> Dict[str, any]:
-    """
-    Parse natural language flight queries into structured Amadeus API commands.
-
-    Args:
-        user_query: Natural language flight query (e.g., "Find flights from ARN to LHR")
-
-    Returns:
-        Dictionary with structured Amadeus API command including endpoint, method, and parameters
-    """
-
-    print(f"\n🔍 Analyzing flight query: '{user_query}'")
-
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-    today = datetime.now().strftime("%Y-%m-%d")
-
-    parser_instructions = f"""You are an Amadeus SDK expert. Generate EXACT request structures based on official SDK templates.
+        token = self._cached_token()
+        if token:
+            return token
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            token = self._cached_token()
+            if token:
+                return token
+
+            logger.info("🔑 Getting new Amadeus access token...")
+
+            auth_data = {
+                'grant_type': 'client_credentials',
+                'client_id': self.client_id,
+                'client_secret': self.client_secret
+            }
 
-CONTEXT:
-- Today: {today}
-- Tomorrow: {tomorrow}
+            response = _SESSION.post(
+                AMADEUS_AUTH_URL,
+                data=auth_data,
+                headers={'Content-Type': 'application/x-www-form-urlencoded'}
+            )
+
+            if response.status_code == 200:
+                token_data = response.json()
+                expires_in = token_data.get('expires_in', 3600)
+                token = token_data['access_token']
+                self._token = (token, datetime.now() + timedelta(seconds=expires_in - TOKEN_EXPIRY_BUFFER_SECONDS))
+                logger.info("✅ Access token obtained successfully")
+                return token
+            else:
+                raise Exception(f"Failed to get Amadeus access token: {response.status_code} - {response.text}")
+
+
+# Static parser prompt, kept byte-identical across calls and ahead of the
+# per-request context. At roughly 700 tokens it is still below OpenAI's
+# 1024-token minimum for automatic prompt caching; the split only makes it
+# cacheable once the prompt grows past that threshold.
+_STATIC_PARSER_PREFIX = """You are an Amadeus SDK expert. Generate EXACT request structures based on official SDK templates.
 
 AMADEUS SDK ENDPOINT TEMPLATES:
 
 1. FLIGHT SEARCH - amadeus.shopping.flightOffersSearch.get(params)
    Endpoint: "shopping/flight-offers"
    Method: "GET"
-   Template: {{
+   Template: {
      "originLocationCode": "ARN",
      "destinationLocationCode": "LHR",
      "departureDate": "2025-10-10",
      "adults": "1",
      "travelClass": "ECONOMY",
      "max": "10"
-   }}
+   }
 
 2. FLIGHT AVAILABILITIES - amadeus.shopping.availability.flightAvailabilities.post(body)
    Endpoint: "shopping/availability/flight-availabilities"
    Method: "POST"
-   Template: {{
-     "originDestinations": [{{
+   Template: {
+     "originDestinations": [{
        "id": "1",
        "originLocationCode": "ARN",
        "destinationLocationCode": "LHR",
-       "departureDateTime": {{
+       "departureDateTime": {
          "date": "2025-10-10"
-       }}
-     }}],
-     "travelers": [{{
+       }
+     }],
+     "travelers": [{
        "id": "1",
        "travelerType": "ADULT"
-     }}],
+     }],
      "sources": ["GDS"]
-   }}
+   }
 
 3. FLIGHT PRICING - amadeus.shopping.flightOffers.pricing.post(body)
    Endpoint: "shopping/flight-offers/pricing"
    Method: "POST"
-   Template: {{
-     "data": {{
+   Template: {
+     "data": {
        "type": "flight-offers-pricing",
-       "flightOffers": [{{
+       "flightOffers": [{
          "type": "flight-offer",
          "id": "1"
-       }}]
-     }}
-   }}
+       }]
+     }
+   }
 
 INTENT MATCHING:
 - "search flights", "find flights", "flight options" → Template 1 (GET)
 - "booking classes", "seat availability", "available seats" → Template 2 (POST)
 - "confirm price", "pricing", "check price" → Template 3 (POST)
 
-PARAMETER MAPPING:
-- Stockholm/ARN: ARN
-- London: LHR
-- Hanoi: HAN
-- SAS: SK
-- Air China: CA
-- Turkish: TK
-
 RESPONSE FORMAT - Use EXACT SDK template structure:
-{{
+{
   "user_intent": "search_flights|booking_classes|price_confirmation",
   "query_type": "flight_search|availability_check|price_confirmation",
-  "amadeus_command": {{
+  "amadeus_command": {
     "endpoint": "exact-endpoint-path",
     "method": "GET|POST",
-    "parameters": {{
+    "parameters": {
       // COPY EXACT TEMPLATE STRUCTURE
       // For GET: flat parameters
       // For POST: nested SDK structure
-    }}
-  }},
+    }
+  },
   "reasoning": "Selected endpoint based on SDK method signature",
   "filled_defaults": [],
   "user_provided": []
-}}
+}
 
 CRITICAL:
 - COPY the exact SDK template structure
 - For booking classes queries, use Template 2 EXACTLY
 - Do NOT modify the nested structure
+- Keep the keys in the RESPONSE FORMAT order (amadeus_command before reasoning)
+- If no date is given, use Tomorrow from CONTEXT
 - Return ONLY valid JSON
 
 EXAMPLE for "booking classes ARN to LHR":
-{{
+{
   "user_intent": "booking_classes",
   "query_type": "availability_check",
-  "amadeus_command": {{
+  "amadeus_command": {
     "endpoint": "shopping/availability/flight-availabilities",
     "method": "POST",
-    "parameters": {{
-      "originDestinations": [{{
+    "parameters": {
+      "originDestinations": [{
         "id": "1",
         "originLocationCode": "ARN",
         "destinationLocationCode": "LHR",
-        "departureDateTime": {{
-          "date": "{tomorrow}"
-        }}
-      }}],
-      "travelers": [{{
+        "departureDateTime": {
+          "date": "2025-10-10"
+        }
+      }],
+      "travelers": [{
         "id": "1",
         "travelerType": "ADULT"
-      }}],
+      }],
       "sources": ["GDS"]
-    }}
-  }}
-}}"""
+    }
+  }
+}"""
+
+
+# Short-lived result caches. Concurrent identical requests wait on the first
+# caller's Future instead of repeating the LLM / Amadeus round-trip.
+_CACHE_LOCK = threading.Lock()
+_PARSE_CACHE = TTLCache(maxsize=256, ttl=60)
+_PARSE_INFLIGHT = {}
+_QUERY_CACHE = TTLCache(maxsize=256, ttl=60)
+_QUERY_INFLIGHT = {}
+
+
+def _singleflight(cache: TTLCache, inflight: dict, key, compute, should_cache=None):
+    """
+    Return a cached result for key, or compute it once for all concurrent callers.
+
+    Args:
+        cache: TTL cache holding finished results
+        inflight: Map of key to the Future of a computation in progress
+        key: Hashable cache key
+        compute: Zero-argument callable producing the result
+        should_cache: Optional predicate; results failing it are shared with
+            waiting callers but not cached
+
+    Returns:
+        The cached, shared or freshly computed result
+    """
+
+    with _CACHE_LOCK:
+        if key in cache:
+            return cache[key]
+        future = inflight.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            inflight[key] = future
+
+    if not is_owner:
+        return future.result()
+
+    try:
+        result = compute()
+    except BaseException as e:
+        with _CACHE_LOCK:
+            inflight.pop(key, None)
+        future.set_exception(e)
+        raise
+
+    with _CACHE_LOCK:
+        inflight.pop(key, None)
+        if should_cache is None or should_cache(result):
+            cache[key] = result
+    future.set_result(result)
+    return result
+
+
+# Initialize Amadeus client
+amadeus_client = AmadeusAPIClient(
+    client_id=os.environ.get('AMADEUS_API_KEY'),
+    client_secret=os.environ.get('AMADEUS_API_SECRECT')
+)
+
+
+# Names rewritten to IATA codes before parsing, so the prompt doesn't need a lookup table
+_CITY_TO_IATA = {
+    "stockholm": "ARN",
+    "london": "LHR",
+    "hanoi": "HAN",
+    "ho chi minh city": "SGN",
+    "beijing": "PEK",
+    "istanbul": "IST",
+    "copenhagen": "CPH",
+    "oslo": "OSL",
+    "helsinki": "HEL",
+    "paris": "CDG",
+    "frankfurt": "FRA",
+    "amsterdam": "AMS",
+    "new york": "JFK",
+}
+_AIRLINE_TO_CODE = {
+    "sas": "SK",
+    "scandinavian airlines": "SK",
+    "air china": "CA",
+    "turkish": "TK",
+    "turkish airlines": "TK",
+    "lufthansa": "LH",
+    "british airways": "BA",
+    "air france": "AF",
+    "klm": "KL",
+    "finnair": "AY",
+    "norwegian": "DY",
+    "vietnam airlines": "VN",
+}
+_IATA_LOOKUP = {**_CITY_TO_IATA, **_AIRLINE_TO_CODE}
+# Longest names first so "turkish airlines" wins over "turkish"
+_IATA_RE = re.compile(
+    r"\b(" + "|".join(re.escape(name) for name in sorted(_IATA_LOOKUP, key=len, reverse=True)) + r")\b",
+    re.I
+)
+
+
+def substitute_iata_codes(user_query: str) -> str:
+    """Replace known city and airline names in the query with their IATA codes."""
+    return _IATA_RE.sub(lambda match: _IATA_LOOKUP[match.group(1).lower()], user_query)
+
+
+# (date, today, tomorrow, parser context message) for the current local day
+_DAY_CONTEXT = (None, "", "", "")
+
+
+def _day_context():
+    """
+    Return today's and tomorrow's dates plus the parser context message.
+
+    The strings are rebuilt only when the day rolls over, so the context
+    message stays identical for all requests of a day.
+    """
+
+    global _DAY_CONTEXT
+    current_day = date.today()
+    if _DAY_CONTEXT[0] != current_day:
+        today = current_day.isoformat()
+        tomorrow = (current_day + timedelta(days=1)).isoformat()
+        # Only the dates change between calls; keep them out of the cached prefix
+        parser_context = f"""CONTEXT:
+- Today: {today}
+- Tomorrow: {tomorrow}"""
+        _DAY_CONTEXT = (current_day, today, tomorrow, parser_context)
+    return _DAY_CONTEXT
+
+
+# Simple query shapes that map straight onto an SDK template without an LLM call.
+# Keywords are case-insensitive, but location codes must already be uppercase
+# IATA codes (substitute_iata_codes rewrites known city names), so ordinary
+# words and unknown cities fall through to the LLM.
+_FAST_RE = re.compile(r"(?:find|search|show)\s+flights?\s+from\s+((?-i:[A-Z]{3}))\s+to\s+((?-i:[A-Z]{3}))(?:\s+on\s+(\d{4}-\d{2}-\d{2}))?", re.I)
+_FAST_AVAILABILITY_RE = re.compile(r"(?:show\s+)?booking\s+class(?:es)?\s+(?:for\s+|from\s+)?((?-i:[A-Z]{3}))\s+to\s+((?-i:[A-Z]{3}))(?:\s+on\s+(\d{4}-\d{2}-\d{2}))?", re.I)
+_FAST_PRICING_RE = re.compile(r"(?:confirm\s+|check\s+)?price\s+(?:for\s+)?offer\s+(\d+)", re.I)
+
+
+def _fast_parse_flight_query(user_query: str, tomorrow: str):
+    """
+    Parse common query shapes with regexes instead of the LLM.
+
+    Args:
+        user_query: Natural language flight query
+        tomorrow: Default departure date (YYYY-MM-DD) when the query has none
+
+    Returns:
+        Parsed query in the same shape the LLM returns, or None if the query
+        is not one of the simple shapes
+    """
+
+    query = user_query.strip().rstrip('.?!')
+
+    match = _FAST_RE.fullmatch(query)
+    if match:
+        origin, destination, date = match.groups()
+        user_provided = ["originLocationCode", "destinationLocationCode"] + (["departureDate"] if date else [])
+        return {
+            "user_intent": "search_flights",
+            "query_type": "flight_search",
+            "amadeus_command": {
+                "endpoint": "shopping/flight-offers",
+                "method": "GET",
+                "parameters": {
+                    "originLocationCode": origin,
+                    "destinationLocationCode": destination,
+                    "departureDate": date or tomorrow,
+                    "adults": "1",
+                    "travelClass": "ECONOMY",
+                    "max": "10"
+                }
+            },
+            "reasoning": "Matched flight search pattern (Template 1)",
+            "filled_defaults": ([] if date else ["departureDate"]) + ["adults", "travelClass", "max"],
+            "user_provided": user_provided
+        }
+
+    match = _FAST_AVAILABILITY_RE.fullmatch(query)
+    if match:
+        origin, destination, date = match.groups()
+        user_provided = ["originLocationCode", "destinationLocationCode"] + (["date"] if date else [])
+        return {
+            "user_intent": "booking_classes",
+            "query_type": "availability_check",
+            "amadeus_command": {
+                "endpoint": "shopping/availability/flight-availabilities",
+                "method": "POST",
+                "parameters": {
+                    "originDestinations": [{
+                        "id": "1",
+                        "originLocationCode": origin,
+                        "destinationLocationCode": destination,
+                        "departureDateTime": {
+                            "date": date or tomorrow
+                        }
+                    }],
+                    "travelers": [{
+                        "id": "1",
+                        "travelerType": "ADULT"
+                    }],
+                    "sources": ["GDS"]
+                }
+            },
+            "reasoning": "Matched booking classes pattern (Template 2)",
+            "filled_defaults": ([] if date else ["date"]) + ["travelers", "sources"],
+            "user_provided": user_provided
+        }
+
+    match = _FAST_PRICING_RE.fullmatch(query)
+    if match:
+        return {
+            "user_intent": "price_confirmation",
+            "query_type": "price_confirmation",
+            "amadeus_command": {
+                "endpoint": "shopping/flight-offers/pricing",
+                "method": "POST",
+                "parameters": {
+                    "data": {
+                        "type": "flight-offers-pricing",
+                        "flightOffers": [{
+                            "type": "flight-offer",
+                            "id": match.group(1)
+                        }]
+                    }
+                }
+            },
+            "reasoning": "Matched price confirmation pattern (Template 3)",
+            "filled_defaults": [],
+            "user_provided": ["id"]
+        }
+
+    return None
+
+
+def _read_parser_stream(stream, received: list) -> Dict[str, any]:
+    """
+    Incrementally parse the streamed parser completion.
+
+    Only user_intent, query_type and amadeus_command are needed downstream, and
+    the prompt asks for them first. As soon as amadeus_command is complete the
+    stream is closed instead of waiting for the informational trailing fields.
+
+    Args:
+        stream: Streaming chat completion
+        received: List that collects the raw text chunks (for error reporting)
+
+    Returns:
+        The parsed JSON object, possibly without its trailing fields
+    """
+
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+    builder = ijson.ObjectBuilder()
 
     try:
-        response = client.chat.completions.create(
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            text = chunk.choices[0].delta.content
+            received.append(text)
+            parser.send(text.encode())
+
+            for prefix, event, value in events:
+                builder.event(event, value)
+                if prefix == 'amadeus_command' and event == 'end_map':
+                    logger.debug("✂️ amadeus_command complete, closing parser stream early")
+                    return builder.value
+            del events[:]
+
+        # Stream ended without an early exit: flush the parser to surface incomplete JSON
+        parser.close()
+        for prefix, event, value in events:
+            builder.event(event, value)
+        return builder.value
+    finally:
+        stream.close()
+
+
+def _parse_with_llm(user_query: str, parser_context: str) -> Dict[str, any]:
+    """Ask gpt-5-mini to map the query onto one of the SDK templates."""
+
+    received = []
+    try:
+        stream = _get_openai_client().chat.completions.create(
             model="gpt-5-mini",
             messages=[
-                {"role": "system", "content": parser_instructions},
+                {"role": "system", "content": _STATIC_PARSER_PREFIX},
+                {"role": "system", "content": parser_context},
                 {"role": "user", "content": user_query}
-            ]
+            ],
+            # JSON mode guarantees a bare JSON object (no markdown fences)
+            response_format={"type": "json_object"},
+            stream=True
         )
 
-        result_text = response.choices[0].message.content.strip()
-
-        # Clean up markdown code blocks if present
-        if result_text.startswith("```json"):
-            result_text = result_text.replace("```json", "").replace("```", "").strip()
-        if result_text.startswith("```"):
-            result_text = result_text.replace("```", "").strip()
+        parsed_result = _read_parser_stream(stream, received)
+        parsed_result.setdefault('reasoning', '')
+        parsed_result.setdefault('filled_defaults', [])
+        parsed_result.setdefault('user_provided', [])
 
-        parsed_result = json.loads(result_text)
-
-        print(f"🎯 Intent: {parsed_result.get('user_intent')}")
-        print(f"🔗 Endpoint: {parsed_result['amadeus_command']['endpoint']}")
-        print(f"⚡ Method: {parsed_result['amadeus_command']['method']}")
+        logger.info("🎯 Intent: %s", parsed_result.get('user_intent'))
+        logger.info("🔗 Endpoint: %s", parsed_result['amadeus_command']['endpoint'])
+        logger.info("⚡ Method: %s", parsed_result['amadeus_command']['method'])
 
         return parsed_result
 
-    except json.JSONDecodeError as e:
-        print(f"❌ JSON error: {e}")
-        raise ValueError(f"Failed to parse JSON: {result_text}")
+    except ijson.JSONError as e:
+        logger.error("❌ JSON error: %s", e)
+        raise ValueError(f"Failed to parse JSON: {''.join(received)}")
     except Exception as e:
-        print(f"❌ Parse error: {e}")
+        logger.error("❌ Parse error: %s", e)
         raise
 
 
-@function_tool(strict_mode=False)
-def execute_amadeus_query(parsed_query_json: str) -> str:
+def parse_flight_query(user_query: str) -> Dict[str, any]:
     """
-    Execute structured Amadeus API query with retry logic.
+    Parse natural language flight queries into structured Amadeus API commands.
 
     Args:
-        parsed_query_json: JSON string containing structured Amadeus API command from query parser
+        user_query: Natural language flight query (e.g., "Find flights from ARN to LHR")
 
     Returns:
-        JSON string containing the full response from Amadeus API
+        Dictionary with structured Amadeus API command including endpoint, method, and parameters
+    """
+
+    logger.info("🔍 Analyzing flight query: '%s'", user_query)
+
+    user_query = substitute_iata_codes(user_query)
+
+    _, today, tomorrow, parser_context = _day_context()
+
+    fast_result = _fast_parse_flight_query(user_query, tomorrow)
+    if fast_result:
+        logger.info("⚡ Matched simple query pattern, skipping LLM")
+        logger.info("🎯 Intent: %s", fast_result['user_intent'])
+        logger.info("🔗 Endpoint: %s", fast_result['amadeus_command']['endpoint'])
+        return fast_result
+
+    # Identical queries within the TTL share one LLM call
+    cache_key = (tomorrow, " ".join(user_query.lower().split()))
+    return _singleflight(
+        _PARSE_CACHE, _PARSE_INFLIGHT, cache_key,
+        lambda: _parse_with_llm(user_query, parser_context)
+    )
+
+
+def _get_disk_cache():
+    """
+    Return the persistent response cache, opening it on first use.
+
+    The cache is optional: if its directory (AMADEUS_CACHE_DIR) can't be used,
+    a warning is logged once and queries run without disk caching.
     """
 
-    print(f"\n🚀 Executing Amadeus API query...")
+    global _disk_cache
+    if _disk_cache is None:
+        with _disk_cache_lock:
+            if _disk_cache is None:
+                import sqlite3
+                from diskcache import Cache
+
+                directory = os.environ.get('AMADEUS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'amadeus_cache'))
+                try:
+                    _disk_cache = Cache(directory, size_limit=256 * 1024 * 1024)
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning("⚠️  Disk cache unavailable at %s, continuing without it: %s", directory, e)
+                    _disk_cache = False
+    return _disk_cache or None
+
+
+def _send_amadeus_request(strategy: dict, method: str, headers: dict, parameters: dict):
+    """
+    Send a single Amadeus API request for one retry strategy.
+
+    Returns:
+        Tuple of (strategy, response, parameters sent, request error). Exactly one
+        of response and request error is None.
+    """
+
+    # Parameters are only read by requests, so share them unless the date changes
+    current_params = parameters
+
+    # Adjust date if strategy requires it
+    if strategy.get('adjust_date') and 'departureDate' in parameters:
+        try:
+            current_date = datetime.strptime(parameters['departureDate'], '%Y-%m-%d')
+            adjusted_date = (current_date + timedelta(days=1)).strftime('%Y-%m-%d')
+            current_params = dict(parameters, departureDate=adjusted_date)
+            logger.info("🔄 Adjusting date to: %s", adjusted_date)
+        except:
+            pass
+
+    full_url = f"{strategy['base_url']}/{strategy['endpoint_clean']}"
+
+    logger.debug("🔄 Trying %s", strategy['description'])
+    logger.debug("📡 Making %s request to: %s", method, full_url)
 
     try:
-        parsed_query = json.loads(parsed_query_json)
-        print(f"🎯 User intent: {parsed_query.get('user_intent', 'unknown')}")
-        print(f"📊 Query type: {parsed_query.get('query_type', 'unknown')}")
+        if method == 'GET':
+            response = _SESSION.get(full_url, headers=headers, params=current_params, stream=True)
+        else:
+            response = _SESSION.post(full_url, headers=headers, json=current_params, stream=True)
+    except requests.RequestException as req_error:
+        logger.warning("❌ Request error with %s: %s", strategy['description'], req_error)
+        return strategy, None, current_params, req_error
+
+    logger.debug("📊 Response status (%s): %s", strategy['description'], response.status_code)
+
+    if response.status_code != 200:
+        # Read small error bodies right away so the connection returns to the pool
+        response.content
+    return strategy, response, current_params, None
+
+
+def _race_amadeus_requests(strategies: list, method: str, headers: dict, parameters: dict):
+    """
+    Send several retry strategies concurrently over the shared session.
+
+    Returns:
+        The first result with a 200 response, otherwise the result of the first
+        strategy, so speculative attempts never mask its status
+        (same tuple shape as _send_amadeus_request)
+    """
+
+    futures = [
+        _RETRY_EXECUTOR.submit(_send_amadeus_request, strategy, method, headers, parameters)
+        for strategy in strategies
+    ]
+    chosen = futures[0]
+    for future in as_completed(futures):
+        response = future.result()[1]
+        if response is not None and response.status_code == 200:
+            chosen = future
+            break
+    result = chosen.result()
+
+    # Streamed responses that lost the race are never read, so close them to
+    # return their connections to the pool
+    for future in futures:
+        if future is not chosen:
+            future.add_done_callback(_close_race_response)
+    return result
+
+
+def _close_race_response(future) -> None:
+    """Close the response of a race attempt whose result is not used."""
+    if future.exception() is None:
+        response = future.result()[1]
+        if response is not None:
+            response.close()
+
+
+def _is_volatile_query(endpoint: str, parameters: dict) -> bool:
+    """
+    Return True if a response should not be cached on disk.
+
+    Price confirmations must always be fresh, and same-day departures change
+    too quickly for a ten-minute cache.
+    """
+
+    if endpoint == 'shopping/flight-offers/pricing':
+        return True
+
+    today = _day_context()[1]
+    departure_dates = [parameters.get('departureDate')] + [
+        origin_destination.get('departureDateTime', {}).get('date')
+        for origin_destination in parameters.get('originDestinations', [])
+    ]
+    return today in departure_dates
+
+
+def _summarize_stream(chunks, endpoint: str) -> dict:
+    """
+    Summarize a streamed Amadeus response body offer by offer.
+
+    Only the offers and the response fields the summary keeps
+    (dictionaries.carriers, warnings) are ever built as objects, so peak memory
+    does not grow with the number of offers.
+
+    Args:
+        chunks: Iterable of decoded body chunks
+        endpoint: Endpoint that produced the body
+
+    Returns:
+        Summary dictionary, as produced by summarize_items
+    """
+
+    # Pricing responses nest the offers under data.flightOffers
+    items_prefix = 'data.flightOffers.item' if endpoint == 'shopping/flight-offers/pricing' else 'data.item'
+    context = {}
+
+    def items():
+        events = ijson.sendable_list()
+        parser = ijson.parse_coro(events, use_float=True)
+        builder = target = None
+
+        # None marks the end of the body: flush the parser
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is None:
+                parser.close()
+            else:
+                parser.send(chunk)
+
+            for prefix, event, value in events:
+                if builder is None:
+                    if event not in ('start_map', 'start_array'):
+                        continue
+                    if prefix not in (items_prefix, 'dictionaries.carriers', 'warnings'):
+                        continue
+                    builder, target = ijson.ObjectBuilder(), prefix
+                builder.event(event, value)
+                if prefix == target and event in ('end_map', 'end_array'):
+                    if target == items_prefix:
+                        yield builder.value
+                    elif target == 'warnings':
+                        context['warnings'] = builder.value
+                    else:
+                        context['dictionaries'] = {'carriers': builder.value}
+                    builder = None
+            del events[:]
+
+    return summarize_items(items(), context)
+
+
+def _read_amadeus_response(response, endpoint: str) -> bytes:
+    """
+    Return a successful Amadeus response body as JSON bytes.
+
+    The body is normally passed through untouched, without a parse and
+    re-serialize round-trip. Once more than STREAM_SUMMARY_THRESHOLD_BYTES have
+    been read, the rest is parsed incrementally and reduced to a summary offer
+    by offer. The size is counted on the decoded body: Content-Length is the
+    compressed size for gzip responses and absent for chunked ones.
+    """
+
+    chunks = response.iter_content(RESPONSE_CHUNK_BYTES)
+    head = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size > STREAM_SUMMARY_THRESHOLD_BYTES:
+            break
+    else:
+        body = b''.join(head)
+        if 'json' in response.headers.get('Content-Type', '') and body.strip():
+            return body
+        # Not declared as JSON: parse it so a bad body fails here, not downstream
+        return orjson.dumps(orjson.loads(body))
+
+    logger.info("🌊 Large response (over %s bytes), summarizing while streaming", STREAM_SUMMARY_THRESHOLD_BYTES)
+    try:
+        return orjson.dumps(_summarize_stream(itertools.chain(head, chunks), endpoint))
+    finally:
+        response.close()
+
+
+def _execute_parsed_query(parsed_query: dict):
+    """
+    Run a parsed Amadeus command through the retry strategies.
+
+    Returns:
+        Tuple of (JSON result, whether the result may be cached for this
+        command). Only successful responses to the parameters as requested are
+        cacheable; a date-adjusted answer belongs to a different query.
+    """
+
+    try:
+        logger.info("🎯 User intent: %s", parsed_query.get('user_intent', 'unknown'))
+        logger.info("📊 Query type: %s", parsed_query.get('query_type', 'unknown'))
 
         amadeus_command = parsed_query.get('amadeus_command', {})
         endpoint = amadeus_command.get('endpoint', '')
         method = amadeus_command.get('method', 'GET').upper()
-        parameters = amadeus_command.get('parameters', {}).copy()
+        parameters = amadeus_command.get('parameters', {})
 
-        print(f"🔗 Endpoint: {endpoint}")
-        print(f"⚡ Method: {method}")
-        print(f"📋 Parameters: {parameters}")
+        logger.info("🔗 Endpoint: %s", endpoint)
+        logger.info("⚡ Method: %s", method)
+        logger.debug("📋 Parameters: %s", parameters)
 
         if not endpoint:
-            return json.dumps({
+            return orjson.dumps({
                 "status": "error",
                 "error": "Missing endpoint in query"
-            })
+            }).decode(), False
+
+        # Repeat queries are served from the on-disk cache
+        disk_cache_key = (endpoint, method, orjson.dumps(parameters, option=orjson.OPT_SORT_KEYS))
+        disk_cache = _get_disk_cache()
+        cached_result = disk_cache.get(disk_cache_key) if disk_cache else None
+        if cached_result is not None:
+            logger.info("💾 Returning cached Amadeus response")
+            return cached_result, True
 
         # Check credentials
         if not amadeus_client.client_id or not amadeus_client.client_secret:
@@ -285,14 +878,14 @@ def execute_amadeus_query(parsed_query_json: str) -> str:
                     "parameters": parameters
                 }
             }
-            print("❌ Credentials not available")
-            return json.dumps(error_result)
+            logger.error("❌ Credentials not available")
+            return orjson.dumps(error_result).decode(), False
 
         # Get access token
         try:
             access_token = amadeus_client.get_access_token()
         except Exception as auth_error:
-            print(f"🔑 Authentication failed: {auth_error}")
+            logger.error("🔑 Authentication failed: %s", auth_error)
             error_result = {
                 "status": "authentication_error",
                 "error": str(auth_error),
@@ -302,103 +895,162 @@ def execute_amadeus_query(parsed_query_json: str) -> str:
                     "parameters": parameters
                 }
             }
-            return json.dumps(error_result)
+            return orjson.dumps(error_result).decode(), False
 
         # Retry strategies
         max_retries = 3
-        retry_strategies = [
-            {"base_url": AMADEUS_BASE_URL_V2, "endpoint_clean": endpoint.replace('v1/', '').replace('v2/', ''), "description": "v2 API"},
-            {"base_url": AMADEUS_BASE_URL_V1, "endpoint_clean": endpoint.replace('v1/', '').replace('v2/', ''), "description": "v1 API"},
-            {"base_url": AMADEUS_BASE_URL_V2, "endpoint_clean": endpoint.replace('v1/', '').replace('v2/', ''), "description": "v2 API with adjusted date", "adjust_date": True}
-        ]
+        endpoint_clean = endpoint.lstrip('/').removeprefix('v1/').removeprefix('v2/')
+
+        # Go straight to the API version that serves this endpoint
+        version = _ENDPOINT_VERSION.get(endpoint_clean, "v2")
+        fallback_version = "v1" if version == "v2" else "v2"
+        primary_strategy = {"base_url": AMADEUS_BASE_URLS[version], "endpoint_clean": endpoint_clean, "description": f"{version} API"}
+        fallback_strategy = {"base_url": AMADEUS_BASE_URLS[fallback_version], "endpoint_clean": endpoint_clean, "description": f"{fallback_version} API"}
+        adjusted_date_strategy = dict(primary_strategy, description=f"{version} API with adjusted date", adjust_date=True)
+
+        tried_strategies = set()
+
+        headers = {'Authorization': f'Bearer {access_token}'}
+
+        attempts_made = 0
+        round_strategies = [primary_strategy]
+        while True:
+            if len(round_strategies) == 1:
+                used_strategy, response, current_params, req_error = _send_amadeus_request(
+                    round_strategies[0], method, headers, parameters
+                )
+            else:
+                used_strategy, response, current_params, req_error = _race_amadeus_requests(
+                    round_strategies, method, headers, parameters
+                )
+            attempts_made += len(round_strategies)
+            tried_strategies.update(s['description'] for s in round_strategies)
+
+            if response is not None and response.status_code == 200:
+                query_info = {
+                    "endpoint": used_strategy['endpoint_clean'],
+                    "method": method,
+                    "parameters": current_params,
+                    "user_intent": parsed_query.get('user_intent', 'unknown'),
+                    "successful_attempt": attempts_made,
+                    "strategy_used": used_strategy['description']
+                }
+                # Splice the response body into the envelope as bytes instead of
+                # parsing it only to serialize it again
+                result_json = (
+                    b'{"status":"success","amadeus_response":'
+                    + _read_amadeus_response(response, used_strategy['endpoint_clean'])
+                    + b',"query_info":' + orjson.dumps(query_info) + b'}'
+                ).decode()
+                logger.info("✅ API call successful on attempt %s", attempts_made)
+                cacheable = current_params is parameters
+                if disk_cache and cacheable and not _is_volatile_query(used_strategy['endpoint_clean'], parameters):
+                    disk_cache.set(disk_cache_key, result_json, expire=RESPONSE_CACHE_TTL_SECONDS)
+                return result_json, cacheable
+
+            # Only retry when a different attempt can plausibly succeed
+            status_code = response.status_code if response is not None else None
+            backoff = 0
+            if status_code in AUTH_ERROR_STATUSES:
+                round_strategies = []
+            elif status_code in BAD_REQUEST_STATUSES:
+                needs_date_retry = 'departureDate' in parameters and adjusted_date_strategy['description'] not in tried_strategies
+                round_strategies = [adjusted_date_strategy] if needs_date_retry else []
+            elif status_code == 404:
+                round_strategies = [fallback_strategy] if fallback_strategy['description'] not in tried_strategies else []
+            elif status_code == 429:
+                # Rate limited: firing more requests in parallel would only make it worse
+                round_strategies = [primary_strategy]
+                backoff = 2 ** (attempts_made - 1) * 0.25
+            elif status_code is None or status_code in TRANSIENT_ERROR_STATUSES:
+                # Server/network trouble. Endpoints of unknown version can race the
+                # other API version against a primary retry; pinned endpoints would
+                # only get a 404 there, so they back off on the primary instead.
+                if endpoint_clean not in _ENDPOINT_VERSION and fallback_strategy['description'] not in tried_strategies:
+                    round_strategies = [primary_strategy, fallback_strategy]
+                else:
+                    round_strategies = [primary_strategy]
+                    backoff = 2 ** (attempts_made - 1) * 0.25
+            else:
+                round_strategies = []
+
+            round_strategies = round_strategies[:max_retries - attempts_made]
+            if not round_strategies:
+                break
+
+            if backoff:
+                logger.warning("⏳ Backing off %.2fs before retrying %s...", backoff, primary_strategy['description'])
+                time.sleep(backoff)
+            else:
+                logger.warning("🔄 Retrying with %s...", ', '.join(s['description'] for s in round_strategies))
+
+        if response is None:
+            error_result = {
+                "status": "request_error",
+                "message": f"Request failed after {attempts_made} attempts",
+                "error": str(req_error)
+            }
+            return orjson.dumps(error_result).decode(), False
 
-        headers = {'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'}
+        error_result = {
+            "status": "amadeus_api_error",
+            "message": f"Amadeus API returned an error after {attempts_made} attempts",
+            "final_status_code": response.status_code,
+            "final_error": response.text,
+            "attempts_made": attempts_made,
+            "query_info": {
+                "endpoint": used_strategy['endpoint_clean'],
+                "method": method,
+                "parameters": current_params
+            }
+        }
+        logger.error("❌ Giving up after %s attempt(s).", attempts_made)
+        return orjson.dumps(error_result).decode(), False
 
-        for attempt in range(max_retries):
-            strategy = retry_strategies[attempt]
-            current_params = parameters.copy()
+    except Exception as e:
+        logger.error("💥 Execution error: %s", e)
+        error_result = {
+            "status": "execution_error",
+            "error": str(e)
+        }
+        return orjson.dumps(error_result).decode(), False
 
-            # Adjust date if strategy requires it
-            if strategy.get('adjust_date') and 'departureDate' in current_params:
-                try:
-                    current_date = datetime.strptime(current_params['departureDate'], '%Y-%m-%d')
-                    adjusted_date = (current_date + timedelta(days=1)).strftime('%Y-%m-%d')
-                    current_params['departureDate'] = adjusted_date
-                    print(f"🔄 Adjusting date to: {adjusted_date}")
-                except:
-                    pass
 
-            full_url = f"{strategy['base_url']}/{strategy['endpoint_clean']}"
+def execute_amadeus_query(parsed_query_json: str) -> str:
+    """
+    Execute structured Amadeus API query with retry logic.
 
-            print(f"🔄 Attempt {attempt + 1}/3: Trying {strategy['description']}")
-            print(f"📡 Making {method} request to: {full_url}")
+    Args:
+        parsed_query_json: JSON string containing structured Amadeus API command from query parser
 
-            try:
-                if method == 'GET':
-                    response = requests.get(full_url, headers=headers, params=current_params)
-                else:
-                    response = requests.post(full_url, headers=headers, json=current_params)
-
-                print(f"📊 Response status: {response.status_code}")
-
-                if response.status_code == 200:
-                    result = {
-                        "status": "success",
-                        "amadeus_response": response.json(),
-                        "query_info": {
-                            "endpoint": strategy['endpoint_clean'],
-                            "method": method,
-                            "parameters": current_params,
-                            "user_intent": parsed_query.get('user_intent', 'unknown'),
-                            "successful_attempt": attempt + 1,
-                            "strategy_used": strategy['description']
-                        }
-                    }
-                    print(f"✅ API call successful on attempt {attempt + 1}")
-                    return json.dumps(result)
-                else:
-                    print(f"❌ Attempt {attempt + 1} failed: {response.status_code}")
-                    if attempt < max_retries - 1:
-                        print(f"🔄 Retrying with different strategy...")
-                        continue
-                    else:
-                        error_result = {
-                            "status": "amadeus_api_error",
-                            "message": f"Amadeus API returned an error after {max_retries} attempts",
-                            "final_status_code": response.status_code,
-                            "final_error": response.text,
-                            "attempts_made": max_retries,
-                            "query_info": {
-                                "endpoint": strategy['endpoint_clean'],
-                                "method": method,
-                                "parameters": current_params
-                            }
-                        }
-                        print(f"❌ All {max_retries} attempts failed.")
-                        return json.dumps(error_result)
+    Returns:
+        JSON string containing the full response from Amadeus API
+    """
 
-            except requests.RequestException as req_error:
-                print(f"❌ Request error on attempt {attempt + 1}: {req_error}")
-                if attempt < max_retries - 1:
-                    continue
-                else:
-                    error_result = {
-                        "status": "request_error",
-                        "message": f"Request failed after {max_retries} attempts",
-                        "error": str(req_error)
-                    }
-                    return json.dumps(error_result)
+    logger.info("🚀 Executing Amadeus API query...")
 
+    try:
+        parsed_query = orjson.loads(parsed_query_json)
+        amadeus_command = parsed_query.get('amadeus_command', {})
+        command_key = orjson.dumps(
+            [amadeus_command.get('endpoint', ''), amadeus_command.get('method', 'GET').upper(), amadeus_command.get('parameters', {})],
+            option=orjson.OPT_SORT_KEYS
+        )
     except Exception as e:
-        print(f"💥 Execution error: {str(e)}")
-        error_result = {
-            "status": "execution_error",
-            "error": str(e)
-        }
-        return json.dumps(error_result)
+        logger.error("💥 Execution error: %s", e)
+        return orjson.dumps({"status": "execution_error", "error": str(e)}).decode()
+
+    # Identical commands within the TTL share one Amadeus round-trip
+    cache_key = hashlib.blake2b(command_key, digest_size=16).digest()
+    result_json, _ = _singleflight(
+        _QUERY_CACHE, _QUERY_INFLIGHT, cache_key,
+        lambda: _execute_parsed_query(parsed_query),
+        should_cache=lambda outcome: outcome[1]
+    )
+    return result_json
 
 
-def create_query_agent() -> Agent:
+def create_query_agent() -> "Agent":
     """
     Factory function to create and configure the Query Agent.
 
@@ -446,9 +1098,12 @@ User: "Find flights from ARN to HAN"
 You are a pipeline component, not the final output. Pass the raw data forward.
 """
 
+    # Imported here so importing this module doesn't pull in the agents SDK
+    from agents import Agent, function_tool
+
     return Agent(
         name="Amadeus Flight Search Agent",
         instructions=instructions,
-        tools=[parse_flight_query, execute_amadeus_query],
+        tools=[function_tool(parse_flight_query), function_tool(execute_amadeus_query, strict_mode=False)],
         model="gpt-5-mini"
     )
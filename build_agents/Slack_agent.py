@@ -10,22 +10,40 @@ Usage:
     start_slack_bot()  # Starts listening for /ask_amadeus commands
 """
 
+import logging
 import os
 import sys
 import ssl
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from slack_sdk import WebClient
-from slack_bolt import App
-from slack_bolt.adapter.socket_mode import SocketModeHandler
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from slack_bolt import App
 
 # Add parent directory to path so we can import build_agents modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv(override=True)
 
+# Set SLACK_DISABLE_SSL_VERIFY=1 only for local networks that intercept TLS
+SLACK_DISABLE_SSL_VERIFY = os.environ.get("SLACK_DISABLE_SSL_VERIFY", "").lower() in ("1", "true", "yes")
+
+# One TLS context for the process, so the Slack client's connections can reuse
+# it (and its session cache) instead of configuring TLS per client
+_SSL_CTX = ssl.create_default_context()
+if SLACK_DISABLE_SSL_VERIFY:
+    _SSL_CTX.check_hostname = False
+    _SSL_CTX.verify_mode = ssl.CERT_NONE
+
+# Runs agent workflows off the Socket Mode worker so new commands aren't blocked
+_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+
 
-def initialize_slack_app() -> App:
+def initialize_slack_app() -> "App":
     """
     Initialize and configure the Slack Bolt app.
 
@@ -45,17 +63,16 @@ def initialize_slack_app() -> App:
     if not slack_app_token:
         raise ValueError("SLACK_APP_TOKEN environment variable is required")
 
-    # Create SSL context that doesn't verify certificates (development only)
-    # WARNING: This should be fixed for production deployment
-    ssl_context = ssl.create_default_context()
-    ssl_context.check_hostname = False
-    ssl_context.verify_mode = ssl.CERT_NONE
+    # Slack SDK imports are deferred until the bot is actually started
+    from slack_sdk import WebClient
+    from slack_bolt import App
 
-    print("✅ Slack app initialized (SSL verification disabled for development)")
-    print("⚠️  WARNING: Fix SSL certificates before production use")
+    if SLACK_DISABLE_SSL_VERIFY:
+        logger.warning("⚠️  WARNING: SSL verification disabled (SLACK_DISABLE_SSL_VERIFY), do not use in production")
+    logger.info("✅ Slack app initialized")
 
-    # Initialize Slack WebClient with custom SSL context
-    web_client = WebClient(token=slack_bot_token, ssl=ssl_context)
+    # Initialize Slack WebClient with the shared SSL context
+    web_client = WebClient(token=slack_bot_token, ssl=_SSL_CTX)
 
     # Initialize Slack Bolt app (only pass client, not token since we already have client)
     app = App(client=web_client)
@@ -63,7 +80,7 @@ def initialize_slack_app() -> App:
     return app
 
 
-def create_command_handler(app: App):
+def create_command_handler(app: "App"):
     """
     Register the /ask_amadeus command handler with the Slack app.
 
@@ -72,17 +89,21 @@ def create_command_handler(app: App):
     """
 
     @app.command("/ask_amadeus")
-    def handle_ask_amadeus_command(ack, command, say):
+    def handle_ask_amadeus_command(ack, command, say, client):
         """
         Handle the /ask_amadeus slash command.
 
         This is the entry point for the Amadeus GDS agent workflow.
         Flow: Slack → Main Agent → Query Agent → Explainer Agent → Slack Response
 
+        Progress updates, the streamed explanation and the final response all
+        edit a single status message instead of posting new ones.
+
         Args:
             ack: Slack acknowledgement function (must be called immediately)
             command: Command payload containing user query and metadata
             say: Function to post messages back to Slack channel
+            client: Slack WebClient used to update the status message
         """
 
         # Acknowledge the command request immediately (required by Slack)
@@ -93,34 +114,44 @@ def create_command_handler(app: App):
         user_id = command.get('user_id', '')
         channel_id = command.get('channel_id', '')
 
-        print(f"\n📨 Received /ask_amadeus command")
-        print(f"👤 User: {user_id}")
-        print(f"📝 Query: '{user_query}'")
-        print(f"📍 Channel: {channel_id}")
+        logger.info("📨 Received /ask_amadeus command")
+        logger.info("👤 User: %s", user_id)
+        logger.info("📝 Query: '%s'", user_query)
+        logger.info("📍 Channel: %s", channel_id)
 
         # Validate user input
         if not user_query:
             say("❌ Please provide a query. Usage: `/ask_amadeus <your flight query>`")
-            print("⚠️  Empty query received")
+            logger.warning("⚠️  Empty query received")
             return
 
         try:
             # Send initial progress message
-            say("👋 Got your message! I am on it. This could take a couple of minutes... ⏱️")
+            status = say("👋 Got your message! I am on it. This could take a couple of minutes... ⏱️")
+
+            def update_status(text: str):
+                client.chat_update(channel=status["channel"], ts=status["ts"], text=text)
+
+            # Run the main agent in the background so this handler returns immediately
+            future = _EXECUTOR.submit(trigger_main_agent, user_query, update_status)
 
-            # Call main_agent to process the query with progress callback
-            response = trigger_main_agent(user_query, say)
+            def post_response(done_future):
+                try:
+                    # Replace the status message with the final response
+                    update_status(done_future.result())
+                    logger.info("✅ Response sent to Slack")
+                except Exception as e:
+                    say(f"❌ Error processing your request: {str(e)}")
+                    logger.error("💥 Error in background agent run: %s", e)
 
-            # Post final response to Slack
-            say(response)
-            print("✅ Response sent to Slack")
+            future.add_done_callback(post_response)
 
         except Exception as e:
             error_message = f"❌ Error processing your request: {str(e)}"
             say(error_message)
-            print(f"💥 Error in command handler: {e}")
+            logger.error("💥 Error in command handler: %s", e)
 
-    print("✅ Command handler registered: /ask_amadeus")
+    logger.info("✅ Command handler registered: /ask_amadeus")
 
 
 def trigger_main_agent(user_query: str, progress_callback=None) -> str:
@@ -135,7 +166,7 @@ def trigger_main_agent(user_query: str, progress_callback=None) -> str:
 
     Args:
         user_query: Natural language query from Slack user
-        progress_callback: Optional callback function for progress updates (e.g., Slack say function)
+        progress_callback: Optional callback function for progress updates (e.g., a Slack message update)
 
     Returns:
         Formatted response string to post back to Slack
@@ -161,10 +192,15 @@ def start_slack_bot():
         Exception: For any other initialization or runtime errors
     """
 
+    from build_agents.log_config import configure_logging
+    from slack_bolt.adapter.socket_mode import SocketModeHandler
+
     try:
-        print("\n" + "="*60)
-        print("🚀 Starting Amadeus GDS Slack Bot")
-        print("="*60 + "\n")
+        configure_logging()
+
+        logger.info("=" * 60)
+        logger.info("🚀 Starting Amadeus GDS Slack Bot")
+        logger.info("=" * 60)
 
         # Initialize Slack app
         app = initialize_slack_app()
@@ -178,21 +214,21 @@ def start_slack_bot():
         # Create Socket Mode handler
         handler = SocketModeHandler(app, slack_app_token)
 
-        print("\n✅ Slack bot is running!")
-        print("💬 Listening for /ask_amadeus commands...")
-        print("\nPress Ctrl+C to stop\n")
+        logger.info("✅ Slack bot is running!")
+        logger.info("💬 Listening for /ask_amadeus commands...")
+        logger.info("Press Ctrl+C to stop")
 
         # Start the bot (blocking call)
         handler.start()
 
     except KeyboardInterrupt:
-        print("\n\n⏹️  Bot stopped by user")
+        logger.info("⏹️  Bot stopped by user")
     except ValueError as ve:
-        print(f"\n❌ Configuration error: {ve}")
-        print("Please check your .env file and ensure all required variables are set.")
+        logger.error("❌ Configuration error: %s", ve)
+        logger.error("Please check your .env file and ensure all required variables are set.")
         raise
     except Exception as e:
-        print(f"\n💥 Error starting bot: {e}")
+        logger.error("💥 Error starting bot: %s", e)
         raise
 
 
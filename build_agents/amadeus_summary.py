@@ -0,0 +1,290 @@
+"""
+Compact summaries of Amadeus API responses
+
+Flight search and pricing payloads carry a lot of data travellers never see
+(fare rules, duplicated dictionaries, pricing internals). These helpers keep
+only the fields the Explainer Agent talks about, so the LLM is not billed for
+the rest.
+
+Usage:
+    from build_agents.amadeus_summary import summarize_amadeus
+
+    summary = summarize_amadeus(amadeus_result)
+"""
+
+import math
+import re
+
+import orjson
+
+# Offers kept for the explainer unless the query asks for a specific number
+DEFAULT_OFFER_LIMIT = 5
+
+# "3 flights", "10 cheapest offers", ...
+_OFFER_LIMIT_RE = re.compile(r"\b(\d{1,2})\s+(?:cheapest\s+)?(?:flights?|offers?|options?|results?)\b", re.IGNORECASE)
+
+# Two-character tokens that may be airline codes ("SK", "D8")
+_CARRIER_CODE_RE = re.compile(r"\b[A-Z0-9]{2}\b")
+
+# Queries about fares keep the per-segment fare details
+_FARE_DETAILS_RE = re.compile(r"fare|class|cabin|bag", re.IGNORECASE)
+
+
+def _summarize_segment(segment: dict) -> dict:
+    """Keep route, times and flight number of a single flight segment."""
+    departure = segment.get('departure', {})
+    arrival = segment.get('arrival', {})
+    return {
+        "from": departure.get('iataCode'),
+        "to": arrival.get('iataCode'),
+        "departure": departure.get('at'),
+        "arrival": arrival.get('at'),
+        "carrier": segment.get('carrierCode'),
+        "number": segment.get('number'),
+        "duration": segment.get('duration')
+    }
+
+
+def summarize_offer(offer: dict) -> dict:
+    """
+    Summarize one flight offer (flight search or pricing response).
+
+    Args:
+        offer: A single item of the Amadeus "flight-offer" type
+
+    Returns:
+        Dictionary with itineraries, total price and per-segment fare details
+    """
+
+    price = offer.get('price', {})
+    traveler_pricings = offer.get('travelerPricings') or [{}]
+
+    return {
+        "id": offer.get('id'),
+        "itineraries": [
+            {
+                "duration": itinerary.get('duration'),
+                "segments": [_summarize_segment(segment) for segment in itinerary.get('segments', [])]
+            }
+            for itinerary in offer.get('itineraries', [])
+        ],
+        "price": {
+            "total": price.get('grandTotal') or price.get('total'),
+            "currency": price.get('currency')
+        },
+        "fareDetails": [
+            {
+                "class": fare.get('class'),
+                "cabin": fare.get('cabin'),
+                "includedCheckedBags": fare.get('includedCheckedBags')
+            }
+            for fare in traveler_pricings[0].get('fareDetailsBySegment', [])
+        ]
+    }
+
+
+def summarize_availability(availability: dict) -> dict:
+    """
+    Summarize one flight availability (booking classes) item.
+
+    Args:
+        availability: A single item of the Amadeus "flight-availability" type
+
+    Returns:
+        Dictionary with the route and the bookable seats per booking class
+    """
+
+    segments = availability.get('segments', [])
+
+    return {
+        "origin": segments[0].get('departure', {}).get('iataCode') if segments else None,
+        "destination": segments[-1].get('arrival', {}).get('iataCode') if segments else None,
+        "segments": [
+            dict(
+                _summarize_segment(segment),
+                bookingClasses={
+                    booking_class.get('class'): booking_class.get('numberOfBookableSeats')
+                    for booking_class in segment.get('availabilityClasses', [])
+                }
+            )
+            for segment in segments
+        ]
+    }
+
+
+def summarize_items(items, context: dict = None) -> dict:
+    """
+    Summarize the items of an Amadeus "data" list.
+
+    Items are consumed one at a time, so a streaming parser can feed this
+    without ever holding the full response in memory. The carriers dictionary
+    and warnings are read from context only after the items are consumed, so
+    the parser may fill it in as it goes.
+
+    Args:
+        items: Iterable of flight-offer and/or flight-availability items
+        context: The rest of the response ("dictionaries", "warnings")
+
+    Returns:
+        Summary dictionary with "offers" and/or "availabilities" lists, plus
+        "carriers" and "warnings" when the response had them
+    """
+
+    summary = {"summarized": True}
+    for item in items:
+        if item.get('type') == 'flight-availability':
+            summary.setdefault("availabilities", []).append(summarize_availability(item))
+        else:
+            summary.setdefault("offers", []).append(summarize_offer(item))
+
+    context = context or {}
+    carriers = (context.get('dictionaries') or {}).get('carriers')
+    if carriers:
+        summary["carriers"] = carriers
+    if context.get('warnings'):
+        summary["warnings"] = context['warnings']
+
+    return summary
+
+
+def _summarize_response(response: dict) -> dict:
+    """Summarize a raw Amadeus API response body."""
+
+    data = response.get('data')
+
+    if isinstance(data, dict):
+        # Pricing responses wrap the offers in a single object
+        return summarize_items(data.get('flightOffers', []), response)
+    if isinstance(data, list):
+        return summarize_items(data, response)
+    return summarize_items([], response)
+
+
+def summarize_amadeus(result: dict) -> dict:
+    """
+    Build a compact version of an Amadeus result for the explainer.
+
+    Accepts either a raw Amadeus response body or the envelope returned by
+    execute_amadeus_query. Envelopes keep their status and query_info; only the
+    embedded response is summarized. Already summarized input and error
+    envelopes are returned unchanged.
+
+    Args:
+        result: Parsed Amadeus response or execute_amadeus_query result
+
+    Returns:
+        Summarized copy of the result
+    """
+
+    if result.get('summarized'):
+        return result
+
+    if 'amadeus_response' in result:
+        response = result['amadeus_response']
+        if not isinstance(response, dict) or response.get('summarized'):
+            return result
+        return dict(result, amadeus_response=_summarize_response(response))
+
+    if 'data' in result:
+        return _summarize_response(result)
+
+    return result
+
+
+def _offer_price(offer: dict) -> float:
+    """Sort key for summarized offers; offers without a usable price go last."""
+    try:
+        return float(offer['price']['total'])
+    except (KeyError, TypeError, ValueError):
+        return math.inf
+
+
+def _offer_carriers(offer: dict) -> set:
+    """Return the carrier codes of all segments of a summarized offer."""
+    return {
+        segment.get('carrier')
+        for itinerary in offer.get('itineraries', [])
+        for segment in itinerary.get('segments', [])
+    }
+
+
+def trim_offers(summary: dict, user_query: str = "") -> dict:
+    """
+    Keep only the most relevant offers of a summary, sized by the user's query.
+
+    Offers operated by airlines named in the query by their code ("SK flights")
+    come first, then offers are ordered by price. The number kept is taken from
+    the query ("show 3 flights"), otherwise DEFAULT_OFFER_LIMIT. Fare details
+    are dropped unless the query is about fares, classes, cabins or baggage.
+    The original offer count is kept as "totalOffers" when offers were cut.
+
+    Args:
+        summary: Summary produced by summarize_items
+        user_query: The user's question, with airline names already replaced
+            by their codes where possible
+
+    Returns:
+        Trimmed copy of the summary
+    """
+
+    offers = summary.get('offers')
+    if not offers:
+        return summary
+
+    match = _OFFER_LIMIT_RE.search(user_query)
+    limit = max(1, int(match.group(1))) if match else DEFAULT_OFFER_LIMIT
+
+    # Only codes that actually occur in the offers count as requested airlines
+    offer_carriers = [_offer_carriers(offer) for offer in offers]
+    requested = set(_CARRIER_CODE_RE.findall(user_query)) & set().union(*offer_carriers)
+
+    ranked = sorted(
+        range(len(offers)),
+        key=lambda index: (not offer_carriers[index] & requested, _offer_price(offers[index]))
+    )
+    trimmed = [offers[index] for index in ranked[:limit]]
+    if not _FARE_DETAILS_RE.search(user_query):
+        trimmed = [{key: value for key, value in offer.items() if key != 'fareDetails'} for offer in trimmed]
+
+    result = dict(summary, offers=trimmed)
+    if len(trimmed) < len(offers):
+        result["totalOffers"] = summary.get("totalOffers", len(offers))
+    return result
+
+
+def compact_api_result(amadeus_api_result: str, user_query: str = "") -> str:
+    """
+    Shrink a JSON Amadeus result to the fields worth explaining.
+
+    Offers are cut down to the cheapest ones relevant to user_query (see
+    trim_offers); airline names in the query are first replaced by their
+    codes, so "SAS flights" ranks SK offers first. Non-JSON input (plain text, truncated JSON, error messages)
+    is returned unchanged.
+
+    Args:
+        amadeus_api_result: Amadeus response or execute_amadeus_query result as a string
+        user_query: The user's original question
+
+    Returns:
+        Compact JSON string of the summary, or the input when it is not a JSON object
+    """
+
+    try:
+        result = orjson.loads(amadeus_api_result)
+    except orjson.JSONDecodeError:
+        return amadeus_api_result
+
+    if not isinstance(result, dict):
+        return amadeus_api_result
+
+    # Imported here: Query_agent itself imports this module
+    from .Query_agent import substitute_iata_codes
+
+    user_query = substitute_iata_codes(user_query)
+    summary = summarize_amadeus(result)
+    if isinstance(summary.get('amadeus_response'), dict):
+        summary = dict(summary, amadeus_response=trim_offers(summary['amadeus_response'], user_query))
+    else:
+        summary = trim_offers(summary, user_query)
+
+    return orjson.dumps(summary).decode()
@@ -12,39 +12,36 @@ Usage:
 """
 
 from dotenv import load_dotenv
+import logging
 import os
-from agents import Agent, function_tool
-from openai import OpenAI
+from typing import TYPE_CHECKING
+from .amadeus_summary import compact_api_result
+
+if TYPE_CHECKING:
+    from agents import Agent
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv(override=True)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+# OpenAI client, created on first use to keep module import fast
+_client = None
 
 
-@function_tool
-def explain_amadeus_response(amadeus_api_result: str, user_original_query: str = "") -> str:
-    """
-    Analyze and explain Amadeus API responses in beginner-friendly language.
+def _get_openai_client():
+    """Return the shared OpenAI client, creating it on first use."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+    return _client
 
-    This function takes raw Amadeus API response data (in any format) and converts it into
-    clear, easy-to-understand explanations tailored to the user's original question.
 
-    Args:
-        amadeus_api_result: API response data (JSON, partial JSON, text, or error messages)
-        user_original_query: The original user query for context (optional)
-
-    Returns:
-        Clear, beginner-friendly explanation of the flight data
-    """
-
-    print(f"\n📖 Explaining Amadeus API response...")
-    if user_original_query:
-        print(f"🎯 Original query context: '{user_original_query}'")
-
-    # System instructions for explaining flight data
-    explainer_instructions = f"""You are a professional Amadeus GDS expert with many years of experience in the Flight Travel Industry.
+# Static explainer rubric, identical across calls and ahead of the per-call
+# context. At roughly 350 tokens it is below OpenAI's 1024-token minimum for
+# automatic prompt caching, so the split only prepares for it.
+_STATIC_EXPLAINER_PREFIX = """You are a professional Amadeus GDS expert with many years of experience in the Flight Travel Industry.
 
 Your task is to analyze the provided Amadeus API response data and create a clear, beginner-friendly explanation.
 
@@ -74,8 +71,6 @@ EXPLANATION STYLE:
 - If the response contains errors or is mock data, explain that clearly
 - If the data is malformed or incomplete, extract and explain what is available
 
-CONTEXT: {user_original_query if user_original_query else "General flight search"}
-
 IMPORTANT:
 - Tailor your explanation to directly answer the user's original question
 - If they asked about booking classes, focus on that
@@ -85,28 +80,52 @@ IMPORTANT:
 
 Format your response with clear headings and bullet points for easy reading in Slack."""
 
+
+def explain_amadeus_response(amadeus_api_result: str, user_original_query: str = "") -> str:
+    """
+    Analyze and explain Amadeus API responses in beginner-friendly language.
+
+    This function takes raw Amadeus API response data (in any format) and converts it into
+    clear, easy-to-understand explanations tailored to the user's original question.
+
+    Args:
+        amadeus_api_result: API response data (JSON, partial JSON, text, or error messages)
+        user_original_query: The original user query for context (optional)
+
+    Returns:
+        Clear, beginner-friendly explanation of the flight data
+    """
+
+    logger.info("📖 Explaining Amadeus API response...")
+    if user_original_query:
+        logger.info("🎯 Original query context: '%s'", user_original_query)
+
+    # Per-call context goes in its own message after the cached static prefix
+    explainer_context = f"CONTEXT: {user_original_query if user_original_query else 'General flight search'}"
+
     try:
         # Call OpenAI to explain the response (no JSON validation needed)
-        response = client.chat.completions.create(
+        response = _get_openai_client().chat.completions.create(
             model="gpt-5-mini",
             messages=[
-                {"role": "system", "content": explainer_instructions},
-                {"role": "user", "content": f"Please explain this Amadeus API response:\n\n{amadeus_api_result}"}
+                {"role": "system", "content": _STATIC_EXPLAINER_PREFIX},
+                {"role": "system", "content": explainer_context},
+                {"role": "user", "content": f"Please explain this Amadeus API response:\n\n{compact_api_result(amadeus_api_result, user_original_query)}"}
             ],
 
         )
 
         explanation = response.choices[0].message.content.strip()
 
-        print("✅ Explanation generated successfully")
+        logger.info("✅ Explanation generated successfully")
         return explanation
 
     except Exception as e:
-        print(f"❌ Explanation error: {e}")
+        logger.error("❌ Explanation error: %s", e)
         return f"I encountered an error while trying to explain the flight data: {str(e)}\n\nHere's the raw response I received:\n\n{amadeus_api_result[:500]}..."
 
 
-def create_explainer_agent() -> Agent:
+def create_explainer_agent() -> "Agent":
     """
     Factory function to create and configure the Explainer Agent.
 
@@ -144,9 +163,12 @@ Example workflow:
 Your goal is to make complex GDS data accessible and easy to understand for travelers, regardless of the data format received.
 """
 
+    # Imported here so importing this module doesn't pull in the agents SDK
+    from agents import Agent, function_tool
+
     return Agent(
         name="Amadeus Response Explainer Agent",
         instructions=instructions,
-        tools=[explain_amadeus_response],
+        tools=[function_tool(explain_amadeus_response)],
         model="gpt-5-mini"
     )
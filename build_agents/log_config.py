@@ -0,0 +1,52 @@
+"""
+Logging setup for the Amadeus GDS agents
+
+Log records are put on a queue and written to stderr by a background
+listener thread, so request threads never block on console I/O.
+
+Usage:
+    from build_agents.log_config import configure_logging
+
+    configure_logging()  # once, at process start
+
+Set LOG_LEVEL (e.g. WARNING in production) to control verbosity.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+_listener = None
+_lock = threading.Lock()
+
+
+def configure_logging(level: str = None) -> None:
+    """
+    Route the root logger through a QueueHandler/QueueListener pair.
+
+    Safe to call more than once; only the first call has an effect.
+
+    Args:
+        level: Log level name; defaults to the LOG_LEVEL environment variable, then INFO
+    """
+
+    global _listener
+
+    with _lock:
+        if _listener is not None:
+            return
+
+        log_queue = queue.Queue(-1)
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter("%(message)s"))
+
+        root_logger = logging.getLogger()
+        root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        root_logger.setLevel((level or os.environ.get("LOG_LEVEL", "INFO")).upper())
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
@@ -1,41 +1,138 @@
 """
 Main Orchestrator Agent for Amadeus GDS System
 
-Coordinates the workflow between query_agent and explainer_agent.
+Coordinates the workflow between query_agent and explainer_agent. The Slack
+pipeline runs both sub-agents directly; create_main_agent exposes the same
+steps as tools for callers that want an orchestrating agent.
 Entry point for Slack integration.
 
 Usage:
-    from build_agents.main_agent import process_user_query
+    from build_agents.main_agent import process_user_query, process_batch
 
     response = process_user_query("Find flights ARN to HAN")
+    responses = process_batch(["Find flights ARN to HAN", "Availability LHR to JFK"])
 """
 
 import os
-import sys
 import asyncio
-import json
+import logging
+import orjson
+import threading
+import time
+from typing import Dict, List
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from agents import Agent, Runner, trace, function_tool
+from openai.types.responses import ResponseTextDeltaEvent
 
-# Add parent directory to path so we can import build_agents modules
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    # Optional: libuv-backed event loop with lower task and socket overhead
+    import uvloop
+    _new_event_loop = uvloop.new_event_loop
+except ImportError:
+    _new_event_loop = asyncio.new_event_loop
 
-from build_agents.Query_agent import create_query_agent
-from build_agents.explainer_agent import create_explainer_agent
+from .Query_agent import create_query_agent
+from .explainer_agent import create_explainer_agent
+from .amadeus_summary import compact_api_result
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv(override=True)
 
+# Upper bound on queries processed at once by process_batch_async, to stay
+# within OpenAI and Amadeus rate limits
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "8"))
+
+# Minimum time between streamed progress updates. Slack's chat.update is rate
+# limited per workspace, and concurrent queries share that budget.
+STREAM_UPDATE_INTERVAL_SECONDS = float(os.getenv("STREAM_UPDATE_INTERVAL_SECONDS", "3.0"))
+
+# Opt-in: draft the answer outline while Amadeus is queried. Costs an extra LLM
+# call per query, so only enable it when latency matters more than token spend
+SPECULATIVE_EXPLAINER = os.getenv("SPECULATIVE_EXPLAINER", "").lower() in ("1", "true", "yes")
+
 # Initialize sub-agents at module level
 query_agent = create_query_agent()
 explainer_agent = create_explainer_agent()
 
-print("✅ Query Agent initialized")
-print("✅ Explainer Agent initialized")
+logger.info("✅ Query Agent initialized")
+logger.info("✅ Explainer Agent initialized")
+
+
+# Literal fragments of the explainer message around its two variable slots
+_EXPLAINER_TMPL = (
+    "\nPlease explain this Amadeus API response to answer the user's question.\n\n"
+    "User's Original Question: ",
+    "\n\nAmadeus API Response:\n",
+    "\n\nProvide a clear, beginner-friendly explanation that directly answers the user's question.\n"
+)
+
+# Appended when a speculative outline was drafted for the query
+_SKELETON_TMPL = "\nStructure the explanation along this outline, filling in the actual data:\n"
+
+_SKELETON_INSTRUCTIONS = """
+You draft the outline of an answer to a flight question before the flight data is available.
+
+Given the user's question, list in a few short bullet points the sections the final
+answer should have (e.g. route and date, flights found, prices, booking classes) in
+the order that best answers the question. Do not invent any flight data.
+"""
+
+# Only built when SPECULATIVE_EXPLAINER is enabled
+_skeleton_agent = None
+
+# Answers to recent queries, and the pipeline runs still in progress. Identical
+# queries arriving together wait for the first run instead of starting their own.
+_result_cache = TTLCache(maxsize=256, ttl=60)
+_inflight: Dict[str, asyncio.Future] = {}
+
 
+def _build_explainer_message(amadeus_api_result: str, user_original_query: str, skeleton: str = "") -> str:
+    """
+    Combine the Amadeus API response and the original question for the explainer agent.
+
+    JSON responses are summarized and cut to the most relevant offers first
+    (airlines named in the question, then the cheapest), so only the fields
+    worth explaining are sent through the explainer agent and its tool call.
+    A speculative outline, when given, is appended for the explainer to follow.
+    """
+
+    parts = [
+        _EXPLAINER_TMPL[0], user_original_query,
+        _EXPLAINER_TMPL[1], compact_api_result(amadeus_api_result, user_original_query),
+        _EXPLAINER_TMPL[2]
+    ]
+    if skeleton:
+        parts += [_SKELETON_TMPL, skeleton]
+    return "".join(parts)
+
+
+async def _draft_skeleton(user_query: str) -> str:
+    """
+    Draft the outline of the answer from the question alone.
 
-@function_tool
-async def query_flight_data(user_query: str) -> str:
+    Runs while the query agent waits for Amadeus. Failures only cost the
+    speculation, so they are logged and an empty outline is returned.
+    """
+
+    global _skeleton_agent
+    if _skeleton_agent is None:
+        _skeleton_agent = Agent(
+            name="Amadeus Response Skeleton Drafter",
+            instructions=_SKELETON_INSTRUCTIONS,
+            model="gpt-5-mini"
+        )
+
+    try:
+        return (await Runner.run(_skeleton_agent, user_query)).final_output
+    except Exception as e:
+        logger.warning("⚠️  Skeleton draft failed, explaining without it: %s", e)
+        return ""
+
+
+async def _query_flight_data_impl(user_query: str) -> str:
     """
     Query flight data from Amadeus API using the query_agent.
 
@@ -48,8 +145,8 @@ async def query_flight_data(user_query: str) -> str:
         JSON string containing Amadeus API response with flight data
     """
 
-    print(f"\n🔍 Query Flight Data Tool called")
-    print(f"📝 User query: '{user_query}'")
+    logger.debug("🔍 Query Flight Data Tool called")
+    logger.debug("📝 User query: '%s'", user_query)
 
     try:
         # Run the query agent to get Amadeus API data
@@ -58,22 +155,21 @@ async def query_flight_data(user_query: str) -> str:
         # Extract the final output (should be the API response)
         api_response = result.final_output
 
-        print(f"✅ Query Agent completed successfully")
+        logger.info("✅ Query Agent completed successfully")
         return api_response
 
     except Exception as e:
         error_msg = f"Error querying flight data: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.error("❌ %s", error_msg)
         # Return error as JSON for consistency
-        return json.dumps({
+        return orjson.dumps({
             "status": "error",
             "error": error_msg,
             "message": "Failed to query flight data from Amadeus API"
-        })
+        }).decode()
 
 
-@function_tool
-async def format_flight_response(amadeus_api_result: str, user_original_query: str) -> str:
+async def _format_flight_response_impl(amadeus_api_result: str, user_original_query: str) -> str:
     """
     Format Amadeus API response into beginner-friendly explanation using explainer_agent.
 
@@ -88,21 +184,12 @@ async def format_flight_response(amadeus_api_result: str, user_original_query: s
         Clear, beginner-friendly formatted response string
     """
 
-    print(f"\n📝 Format Flight Response Tool called")
-    print(f"🎯 Original query: '{user_original_query}'")
+    logger.debug("📝 Format Flight Response Tool called")
+    logger.debug("🎯 Original query: '%s'", user_original_query)
 
     try:
         # Prepare message for explainer agent with both API data and original query
-        explainer_message = f"""
-Please explain this Amadeus API response to answer the user's question.
-
-User's Original Question: {user_original_query}
-
-Amadeus API Response:
-{amadeus_api_result}
-
-Provide a clear, beginner-friendly explanation that directly answers the user's question.
-"""
+        explainer_message = _build_explainer_message(amadeus_api_result, user_original_query)
 
         # Run the explainer agent
         result = await Runner.run(explainer_agent, explainer_message)
@@ -110,12 +197,12 @@ Provide a clear, beginner-friendly explanation that directly answers the user's
         # Extract the formatted explanation
         formatted_response = result.final_output
 
-        print(f"✅ Explainer Agent completed successfully")
+        logger.info("✅ Explainer Agent completed successfully")
         return formatted_response
 
     except Exception as e:
         error_msg = f"Error formatting response: {str(e)}"
-        print(f"❌ {error_msg}")
+        logger.error("❌ %s", error_msg)
         # Return a fallback message with the raw data
         return f"I received flight data but had trouble formatting it clearly. Here's what I found:\n\n{amadeus_api_result}\n\nError: {error_msg}"
 
@@ -165,64 +252,214 @@ User: "Find SK flights from ARN to HAN"
 Your goal is to orchestrate a smooth workflow that gives users clear, helpful flight information.
 """
 
+    # Tool wrappers (schema and argument validation) are only needed when an
+    # LLM drives the workflow, so they are built here rather than at import
     return Agent(
         name="Amadeus GDS Main Orchestrator",
         instructions=instructions,
-        tools=[query_flight_data, format_flight_response],
+        tools=[
+            function_tool(_query_flight_data_impl, name_override="query_flight_data"),
+            function_tool(_format_flight_response_impl, name_override="format_flight_response")
+        ],
         model="gpt-5-mini"
     )
 
 
+async def _report_progress(progress_callback, text: str) -> None:
+    """
+    Send a progress update, if a callback was given, without blocking the shared event loop.
+
+    Updates are cosmetic, so a failing callback (e.g. a rate-limited Slack
+    chat.update) is logged and never aborts the query.
+    """
+    if not progress_callback:
+        return
+    try:
+        # The callback does blocking I/O (e.g. a Slack chat.update)
+        await asyncio.to_thread(progress_callback, text)
+    except Exception as e:
+        logger.warning("⚠️  Progress update failed: %s", e)
+
+
+async def _run_explainer_streamed(explainer_message: str, progress_callback=None) -> str:
+    """
+    Run the explainer agent, forwarding the partial explanation as it is generated.
+
+    Args:
+        explainer_message: Message built by _build_explainer_message
+        progress_callback: Optional callback receiving the text generated so far,
+            at most once per STREAM_UPDATE_INTERVAL_SECONDS
+
+    Returns:
+        The complete explanation
+    """
+
+    result = Runner.run_streamed(explainer_agent, explainer_message)
+    chunks = []
+    last_update = time.monotonic()
+
+    async for event in result.stream_events():
+        if event.type != "raw_response_event" or not isinstance(event.data, ResponseTextDeltaEvent):
+            continue
+        chunks.append(event.data.delta)
+
+        if progress_callback and time.monotonic() - last_update >= STREAM_UPDATE_INTERVAL_SECONDS:
+            await _report_progress(progress_callback, "".join(chunks) + " ✍️")
+            last_update = time.monotonic()
+
+    return result.final_output
+
+
+def _normalize(user_query: str) -> str:
+    """Return the coalescing key of a query: lowercased, whitespace collapsed."""
+    return " ".join(user_query.lower().split())
+
+
+def _is_success_envelope(api_response: str) -> bool:
+    """Return True if the query agent's output is a successful execute_amadeus_query result."""
+    try:
+        result = orjson.loads(api_response)
+    except orjson.JSONDecodeError:
+        return False
+    return isinstance(result, dict) and result.get('status') == 'success'
+
+
+async def _run_workflow(user_query: str, progress_callback=None):
+    """
+    Query Amadeus and explain the result. Raises on failure.
+
+    Returns:
+        Tuple of (formatted response, whether Amadeus answered successfully).
+        Explanations of Amadeus errors are still returned but must not be cached.
+    """
+
+    logger.info("🚀 Processing query: %s", user_query)
+
+    # Progress update: Starting to query Amadeus
+    await _report_progress(progress_callback, "✈️ Currently having a nice convo with Amadeus... 💬")
+
+    # The workflow is fixed (query, then explain), so the sub-agents are run
+    # directly instead of letting an orchestrator LLM decide to call them
+    with trace("main_agent_workflow", metadata={"query": user_query}):
+        if SPECULATIVE_EXPLAINER:
+            query_result, skeleton = await asyncio.gather(
+                Runner.run(query_agent, user_query),
+                _draft_skeleton(user_query)
+            )
+        else:
+            query_result, skeleton = await Runner.run(query_agent, user_query), ""
+        api_response = query_result.final_output
+
+        # Progress update: Got response, now formatting
+        await _report_progress(progress_callback, "📋 Got the Amadeus response, making it sensible for you now... 🧠")
+
+        explainer_message = _build_explainer_message(api_response, user_query, skeleton)
+        response = await _run_explainer_streamed(explainer_message, progress_callback)
+
+    logger.info("✅ Workflow completed successfully")
+
+    return response, _is_success_envelope(api_response)
+
+
 async def process_user_query_async(user_query: str, progress_callback=None) -> str:
     """
-    Process a user query through the main agent workflow (async version).
+    Process a user query through the agent workflow (async version).
 
-    This function orchestrates the complete workflow:
+    This function runs the complete workflow:
     1. Query agent gets Amadeus API data
     2. Explainer agent formats the response
     3. Returns formatted response for Slack
 
+    Answers built on a successful Amadeus response are reused for 60 seconds, and a query identical to one
+    already in progress waits for that run instead of starting its own (only
+    the first caller receives progress updates).
+
     Args:
         user_query: Natural language query from Slack user
-        progress_callback: Optional callback function to report progress updates
+        progress_callback: Optional callback function to report progress updates,
+            including the partial explanation while it is streamed
 
     Returns:
         str: Formatted response ready for Slack posting
     """
 
+    key = _normalize(user_query)
+
+    cached = _result_cache.get(key)
+    if cached is not None:
+        logger.info("♻️  Reusing recent answer for: %s", user_query)
+        return cached
+
+    loop = asyncio.get_running_loop()
+    pending = _inflight.get(key)
+    if pending is not None and pending.get_loop() is loop:
+        logger.info("⏳ Waiting for identical query in progress: %s", user_query)
+        # Shielded so a cancelled waiter doesn't cancel the shared run
+        return await asyncio.shield(pending)
+
+    future = loop.create_future()
+    _inflight[key] = future
     try:
-        print(f"\n{'='*60}")
-        print(f"🚀 Processing query: {user_query}")
-        print(f"{'='*60}\n")
+        try:
+            response, succeeded = await _run_workflow(user_query, progress_callback)
+            if succeeded:
+                _result_cache[key] = response
+        except Exception as e:
+            logger.error("❌ Error processing query: %s", e)
+            response = f"Sorry, I encountered an error while processing your request: {str(e)}\n\nPlease try again or contact support."
+        future.set_result(response)
+        return response
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+        if not future.done():
+            future.cancel()
 
-        # Progress update: Starting to query Amadeus
-        if progress_callback:
-            progress_callback("✈️ Currently having a nice convo with Amadeus... 💬")
 
-        # Create main agent instance
-        main_agent = create_main_agent()
+async def process_batch_async(user_queries: List[str]) -> List[str]:
+    """
+    Process several user queries concurrently (async version).
 
-        # Run the agent workflow with tracing
-        with trace("main_agent_workflow", metadata={"query": user_query}):
-            result = await Runner.run(main_agent, user_query)
+    At most MAX_CONCURRENCY queries run at the same time. Errors are already
+    turned into user-facing messages by process_user_query_async, so one
+    failing query does not affect the others.
 
-        # Progress update: Got response, now formatting
-        if progress_callback:
-            progress_callback("📋 Got the Amadeus response, making it sensible for you now... 🧠")
+    Args:
+        user_queries: Natural language queries, e.g. from simultaneous Slack commands
 
-        # Extract the final response
-        response = result.final_output
+    Returns:
+        List of formatted responses, in the same order as user_queries
+    """
 
-        print(f"\n{'='*60}")
-        print(f"✅ Workflow completed successfully")
-        print(f"{'='*60}\n")
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
 
-        return response
+    async def process_one(user_query: str) -> str:
+        async with semaphore:
+            return await process_user_query_async(user_query)
 
-    except Exception as e:
-        error_message = f"❌ Error processing query: {str(e)}"
-        print(f"\n{error_message}\n")
-        return f"Sorry, I encountered an error while processing your request: {str(e)}\n\nPlease try again or contact support."
+    return list(await asyncio.gather(*(process_one(user_query) for user_query in user_queries)))
+
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the event loop used by the synchronous entry point.
+
+    The loop is created on first use (uvloop when installed) and runs forever
+    in a daemon thread.
+    Queries submitted from several threads run concurrently on it.
+    """
+
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = _new_event_loop()
+            threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+            _background_loop = loop
+    return _background_loop
 
 
 def process_user_query(user_query: str, progress_callback=None) -> str:
@@ -230,7 +467,7 @@ def process_user_query(user_query: str, progress_callback=None) -> str:
     Synchronous wrapper for process_user_query_async.
 
     This is the main entry point called by Slack handler.
-    Handles event loop management for both Jupyter and script environments.
+    Async callers should await process_user_query_async directly instead.
 
     Args:
         user_query: Natural language query from Slack user
@@ -240,14 +477,25 @@ def process_user_query(user_query: str, progress_callback=None) -> str:
         str: Formatted response ready for Slack posting
     """
 
-    try:
-        # Try to get the running event loop
-        loop = asyncio.get_running_loop()
-        # If we're here, there's already a loop running (Jupyter)
-        import nest_asyncio
-        nest_asyncio.apply()
-        return asyncio.run(process_user_query_async(user_query, progress_callback))
-    except RuntimeError:
-        # No event loop running (normal Python script)
-        return asyncio.run(process_user_query_async(user_query, progress_callback))
+    # Runs on the shared background loop, so it works the same from plain
+    # threads (Slack handlers) and from code that already has a loop (Jupyter)
+    future = asyncio.run_coroutine_threadsafe(
+        process_user_query_async(user_query, progress_callback),
+        _get_background_loop()
+    )
+    return future.result()
+
+
+def process_batch(user_queries: List[str]) -> List[str]:
+    """
+    Synchronous wrapper for process_batch_async.
+
+    Args:
+        user_queries: Natural language queries to process concurrently
+
+    Returns:
+        List of formatted responses, in the same order as user_queries
+    """
 
+    future = asyncio.run_coroutine_threadsafe(process_batch_async(user_queries), _get_background_loop())
+    return future.result()
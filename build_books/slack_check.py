@@ -0,0 +1,52 @@
+"""
+Shared Slack connection check for the diagnostic scripts
+
+Both diagnose_slack.py and test_slack_connection.py verify the bot token
+with a single auth.test call made through this helper.
+
+Usage:
+    import asyncio
+    from slack_check import BOT_TOKEN_RE, SSL_CONTEXT, check_slack
+
+    if BOT_TOKEN_RE.fullmatch(bot_token):
+        auth = asyncio.run(check_slack(bot_token, SSL_CONTEXT))
+
+Certificates are verified unless SLACK_DISABLE_SSL_VERIFY=1 is set.
+"""
+
+import os
+import re
+import ssl
+
+# Structure of Slack bot (xoxb-) and app-level (xapp-) tokens, checked locally
+# before any network call
+BOT_TOKEN_RE = re.compile(r"xoxb-\d+-\d+-[A-Za-z0-9]+")
+APP_TOKEN_RE = re.compile(r"xapp-\d-[A-Z0-9]+-\d+-[a-f0-9]+")
+
+# Shared TLS context; verification is only disabled on explicit opt-out
+SSL_CONTEXT = ssl.create_default_context()
+if os.environ.get("SLACK_DISABLE_SSL_VERIFY", "").lower() in ("1", "true", "yes"):
+    SSL_CONTEXT.check_hostname = False
+    SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+
+
+async def check_slack(bot_token: str, ssl_context: ssl.SSLContext = None) -> dict:
+    """
+    Verify the bot token against the Slack API with one auth.test call.
+
+    Args:
+        bot_token: Slack bot token (xoxb-...)
+        ssl_context: Optional SSL context for the HTTPS connection
+
+    Returns:
+        The auth.test response data (user, user_id, team, team_id, ...)
+
+    Raises:
+        SlackApiError: If Slack rejects the token
+    """
+
+    from slack_sdk.web.async_client import AsyncWebClient
+
+    client = AsyncWebClient(token=bot_token, ssl=ssl_context)
+    auth_response = await client.auth_test()
+    return auth_response.data
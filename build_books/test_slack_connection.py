@@ -4,22 +4,21 @@ Test Slack Connection and Command Registration
 This script tests if the Slack bot can connect and if the command is properly registered.
 """
 
+import asyncio
 import os
-from dotenv import load_dotenv
-from slack_sdk import WebClient
-import ssl
 
-load_dotenv(override=True)
+# Only read .env when the tokens aren't already in the environment
+if not (os.environ.get("SLACK_BOT_TOKEN") and os.environ.get("SLACK_APP_TOKEN")):
+    from dotenv import load_dotenv
+    load_dotenv(override=True)
+
+# Imported after load_dotenv so SLACK_DISABLE_SSL_VERIFY from .env is honoured
+from slack_check import APP_TOKEN_RE, BOT_TOKEN_RE, SSL_CONTEXT, check_slack
 
 print("=" * 60)
 print("🧪 Testing Slack Connection")
 print("=" * 60)
 
-# Create SSL context
-ssl_context = ssl.create_default_context()
-ssl_context.check_hostname = False
-ssl_context.verify_mode = ssl.CERT_NONE
-
 # Get tokens
 bot_token = os.environ.get("SLACK_BOT_TOKEN")
 app_token = os.environ.get("SLACK_APP_TOKEN")
@@ -32,14 +31,22 @@ if not app_token:
     print("❌ SLACK_APP_TOKEN not found")
     exit(1)
 
+# Reject malformed tokens locally instead of waiting for Slack to refuse them
+if not BOT_TOKEN_RE.fullmatch(bot_token):
+    print("❌ SLACK_BOT_TOKEN has an incorrect format (expected xoxb-...)")
+    exit(1)
+
+if not APP_TOKEN_RE.fullmatch(app_token):
+    print("❌ SLACK_APP_TOKEN has an incorrect format (expected xapp-...)")
+    exit(1)
+
 print(f"✅ Bot Token found: {bot_token[:15]}...")
 print(f"✅ App Token found: {app_token[:15]}...")
 
 # Test WebClient connection
 print("\n📡 Testing Slack API connection...")
 try:
-    client = WebClient(token=bot_token, ssl=ssl_context)
-    auth_response = client.auth_test()
+    auth_response = asyncio.run(check_slack(bot_token, SSL_CONTEXT))
 
     print(f"✅ Successfully connected to Slack!")
     print(f"   Bot User ID: {auth_response['user_id']}")